@@ -6,8 +6,15 @@
 """
 
 import json
-import random
-from typing import Dict, List, Any, Tuple
+from collections import defaultdict
+from functools import lru_cache
+from random import getrandbits
+from typing import Dict, List, Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 try:
     from .model import HypothesisMap, Goal, Subject, Hypothesis, Task, Priority
@@ -24,32 +31,165 @@ COLORS = {
     "stroke": "#1e1e1e",
 }
 
+
+class _PriorityDict(dict):
+    """Словарь по приоритету: для неизвестного ключа отдаёт значение Priority.NONE."""
+
+    def __missing__(self, key):
+        return self[Priority.NONE]
+
+
 # Цвета приоритетов для стрелок
-PRIORITY_COLORS = {
+PRIORITY_COLORS = _PriorityDict({
     Priority.HIGH: "#FF7373",
     Priority.MEDIUM: "#FFC831",
     Priority.LOW: "#8FD14F",
     Priority.NONE: "#70736d",
-}
+})
 
 # Толщина стрелок по приоритету
-PRIORITY_STROKE = {
+PRIORITY_STROKE = _PriorityDict({
     Priority.HIGH: 4,
     Priority.MEDIUM: 3,
     Priority.LOW: 2,
     Priority.NONE: 2,
+})
+
+# Подписи приоритета на карточке гипотезы
+PRIORITY_LABELS = {
+    Priority.HIGH: "🔴 Высокий",
+    Priority.MEDIUM: "🟡 Средний",
+    Priority.LOW: "🟢 Низкий",
+}
+
+
+# Шаблоны элементов Excalidraw: статичные поля заполняются один раз при импорте,
+# фабрики копируют шаблон через dict.copy() и дописывают только изменяемые поля.
+# Изменяемые значения (списки, вложенные словари) задаются заново для каждой копии.
+# Шаблон содержит все ключи элемента, поэтому копия уже нужного размера и
+# присваивания в фабриках не добавляют ключей и не перестраивают хеш-таблицу.
+# Строковые значения шаблонов и COLORS — одни и те же объекты во всех элементах.
+_RECT_TEMPLATE = {
+    "id": None,
+    "type": "rectangle",
+    "x": 0,
+    "y": 0,
+    "width": 0,
+    "height": 0,
+    "angle": 0,
+    "strokeColor": COLORS["stroke"],
+    "backgroundColor": "transparent",
+    "fillStyle": "solid",
+    "strokeWidth": 2,
+    "strokeStyle": "solid",
+    "roughness": 0,
+    "opacity": 100,
+    "groupIds": None,
+    "frameId": None,
+    "roundness": None,
+    "seed": 0,
+    "version": 1,
+    "versionNonce": 0,
+    "isDeleted": False,
+    "boundElements": None,
+    "updated": 1,
+    "link": None,
+    "locked": False
+}
+
+_TEXT_TEMPLATE = {
+    "id": None,
+    "type": "text",
+    "x": 0,
+    "y": 0,
+    "width": 0,
+    "height": 0,
+    "angle": 0,
+    "strokeColor": COLORS["stroke"],
+    "backgroundColor": "transparent",
+    "fillStyle": "solid",
+    "strokeWidth": 1,
+    "strokeStyle": "solid",
+    "roughness": 0,
+    "opacity": 100,
+    "groupIds": None,
+    "frameId": None,
+    "roundness": None,
+    "seed": 0,
+    "version": 1,
+    "versionNonce": 0,
+    "isDeleted": False,
+    "boundElements": None,
+    "updated": 1,
+    "link": None,
+    "locked": False,
+    "text": "",
+    "fontSize": 14,
+    "fontFamily": 3,  # Monospace
+    "textAlign": "left",
+    "verticalAlign": "middle",
+    "containerId": None,
+    "originalText": "",
+    "lineHeight": 1.25
+}
+
+_LABEL_TEMPLATE = {
+    **_TEXT_TEMPLATE,
+    "height": 30,
+    "strokeColor": "#868e96",
+    "fontSize": 18,
+    "textAlign": "center",
+    "verticalAlign": "top",
+}
+
+_ARROW_TEMPLATE = {
+    "id": None,
+    "type": "arrow",
+    "x": 0,
+    "y": 0,
+    "width": 0,
+    "height": 0,
+    "angle": 0,
+    "strokeColor": COLORS["stroke"],
+    "backgroundColor": "transparent",
+    "fillStyle": "solid",
+    "strokeWidth": 2,
+    "strokeStyle": "solid",
+    "roughness": 0,
+    "opacity": 100,
+    "groupIds": None,
+    "frameId": None,
+    "roundness": None,
+    "seed": 0,
+    "version": 1,
+    "versionNonce": 0,
+    "isDeleted": False,
+    "boundElements": None,
+    "updated": 1,
+    "link": None,
+    "locked": False,
+    "points": None,
+    "lastCommittedPoint": None,
+    "startBinding": None,
+    "endBinding": None,
+    "startArrowhead": None,
+    "endArrowhead": "arrow"
 }
 
 
 def generate_id() -> str:
     """Генерирует уникальный ID."""
-    return f"{random.randint(100000, 999999)}"
+    return f"{getrandbits(32) % 900000 + 100000}"
 
 
-def wrap_text(text: str, max_chars_per_line: int = 30) -> str:
+@lru_cache(maxsize=4096)
+def wrap_text_counted(text: str, max_chars_per_line: int = 30) -> Tuple[str, int]:
     """
     Переносит текст по словам, чтобы строки не превышали max_chars_per_line.
     Сохраняет существующие переносы строк.
+
+    Returns:
+        Кортеж (перенесённый текст, число строк)
     """
     lines = text.split('\n')
     wrapped_lines = []
@@ -58,25 +198,43 @@ def wrap_text(text: str, max_chars_per_line: int = 30) -> str:
         if len(line) <= max_chars_per_line:
             wrapped_lines.append(line)
         else:
+            # Один проход по длинам слов: строка — срез words[start:i],
+            # width — её длина с пробелами (0 — строка пока пустая)
             words = line.split(' ')
-            current_line = ""
-            for word in words:
-                if not current_line:
-                    current_line = word
-                elif len(current_line) + 1 + len(word) <= max_chars_per_line:
-                    current_line += " " + word
+            start = 0
+            width = 0
+            for i, word_len in enumerate(map(len, words)):
+                if not width:
+                    start = i
+                    width = word_len
+                elif width + 1 + word_len <= max_chars_per_line:
+                    width += 1 + word_len
                 else:
-                    wrapped_lines.append(current_line)
-                    current_line = word
-            if current_line:
-                wrapped_lines.append(current_line)
+                    wrapped_lines.append(' '.join(words[start:i]))
+                    start = i
+                    width = word_len
+            if width:
+                wrapped_lines.append(' '.join(words[start:]))
+
+    # Пустой результат — всё равно одна (пустая) строка
+    return '\n'.join(wrapped_lines), len(wrapped_lines) or 1
 
-    return '\n'.join(wrapped_lines)
+
+def wrap_text(text: str, max_chars_per_line: int = 30) -> str:
+    """
+    Переносит текст по словам, чтобы строки не превышали max_chars_per_line.
+    Сохраняет существующие переносы строк.
+
+    Результаты кэшируются в wrap_text_counted по (text, max_chars_per_line);
+    для долгоживущих процессов кэш можно сбросить через
+    wrap_text_counted.cache_clear().
+    """
+    return wrap_text_counted(text, max_chars_per_line)[0]
 
 
 def generate_seed() -> int:
     """Генерирует seed для Excalidraw."""
-    return random.randint(100000000, 999999999)
+    return getrandbits(32) % 900000000 + 100000000
 
 
 def create_card(
@@ -88,83 +246,52 @@ def create_card(
     height: float,
     bg_color: str,
     text: str,
-    font_size: int = 14
+    font_size: int = 14,
+    line_count: Optional[int] = None
 ) -> Tuple[Dict, Dict]:
     """
     Создаёт карточку (прямоугольник + текст внутри).
 
+    line_count — число строк текста, если уже известно (например, из
+    wrap_text_counted); иначе считается по переносам в text.
+
     Returns:
         Кортеж (rectangle_element, text_element)
     """
     # Оценка высоты текста
-    lines = text.count('\n') + 1
-    text_height = lines * font_size * 1.25
+    if line_count is None:
+        line_count = text.count('\n') + 1
+    text_height = line_count * font_size * 1.25
 
     # Прямоугольник
-    rect = {
-        "id": card_id,
-        "type": "rectangle",
-        "x": x,
-        "y": y,
-        "width": width,
-        "height": height,
-        "angle": 0,
-        "strokeColor": COLORS["stroke"],
-        "backgroundColor": bg_color,
-        "fillStyle": "solid",
-        "strokeWidth": 2,
-        "strokeStyle": "solid",
-        "roughness": 0,
-        "opacity": 100,
-        "groupIds": [],
-        "frameId": None,
-        "roundness": {"type": 3},
-        "seed": generate_seed(),
-        "version": 1,
-        "versionNonce": generate_seed(),
-        "isDeleted": False,
-        "boundElements": [{"id": text_id, "type": "text"}],
-        "updated": 1,
-        "link": None,
-        "locked": False
-    }
+    rect = _RECT_TEMPLATE.copy()
+    rect["id"] = card_id
+    rect["x"] = x
+    rect["y"] = y
+    rect["width"] = width
+    rect["height"] = height
+    rect["backgroundColor"] = bg_color
+    rect["groupIds"] = []
+    rect["roundness"] = {"type": 3}
+    rect["seed"] = generate_seed()
+    rect["versionNonce"] = generate_seed()
+    rect["boundElements"] = [{"id": text_id, "type": "text"}]
 
     # Текст (привязан к прямоугольнику) — центрирован по вертикали
-    text_elem = {
-        "id": text_id,
-        "type": "text",
-        "x": x + 10,
-        "y": y + (height - text_height) / 2,
-        "width": width - 20,
-        "height": text_height,
-        "angle": 0,
-        "strokeColor": COLORS["stroke"],
-        "backgroundColor": "transparent",
-        "fillStyle": "solid",
-        "strokeWidth": 1,
-        "strokeStyle": "solid",
-        "roughness": 0,
-        "opacity": 100,
-        "groupIds": [],
-        "frameId": None,
-        "roundness": None,
-        "seed": generate_seed(),
-        "version": 1,
-        "versionNonce": generate_seed(),
-        "isDeleted": False,
-        "boundElements": [],
-        "updated": 1,
-        "link": None,
-        "locked": False,
-        "text": text,
-        "fontSize": font_size,
-        "fontFamily": 3,  # Monospace
-        "textAlign": "left",
-        "verticalAlign": "middle",
-        "containerId": card_id,
-        "originalText": text,
-        "lineHeight": 1.25
-    }
+    text_elem = _TEXT_TEMPLATE.copy()
+    text_elem["id"] = text_id
+    text_elem["x"] = x + 10
+    text_elem["y"] = y + (height - text_height) / 2
+    text_elem["width"] = width - 20
+    text_elem["height"] = text_height
+    text_elem["groupIds"] = []
+    text_elem["seed"] = generate_seed()
+    text_elem["versionNonce"] = generate_seed()
+    text_elem["boundElements"] = []
+    text_elem["text"] = text
+    text_elem["fontSize"] = font_size
+    text_elem["containerId"] = card_id
+    text_elem["originalText"] = text
 
     return rect, text_elem
 
@@ -181,99 +308,80 @@ def create_arrow(
     stroke_width: int = 2
 ) -> Dict:
     """Создаёт стрелку между элементами."""
-    return {
-        "id": arrow_id,
-        "type": "arrow",
-        "x": start_x,
-        "y": start_y,
-        "width": abs(end_x - start_x),
-        "height": abs(end_y - start_y),
-        "angle": 0,
-        "strokeColor": color,
-        "backgroundColor": "transparent",
-        "fillStyle": "solid",
-        "strokeWidth": stroke_width,
-        "strokeStyle": "solid",
-        "roughness": 0,
-        "opacity": 100,
-        "groupIds": [],
-        "frameId": None,
-        "roundness": {"type": 2},
-        "seed": generate_seed(),
-        "version": 1,
-        "versionNonce": generate_seed(),
-        "isDeleted": False,
-        "boundElements": [],
-        "updated": 1,
-        "link": None,
-        "locked": False,
-        "points": [[0, 0], [end_x - start_x, end_y - start_y]],
-        "lastCommittedPoint": None,
-        "startBinding": {
-            "elementId": start_id,
-            "focus": 0,
-            "gap": 5
-        },
-        "endBinding": {
-            "elementId": end_id,
-            "focus": 0,
-            "gap": 5
-        },
-        "startArrowhead": None,
-        "endArrowhead": "arrow"
+    dx = end_x - start_x
+    dy = end_y - start_y
+    arrow = _ARROW_TEMPLATE.copy()
+    arrow["id"] = arrow_id
+    arrow["x"] = start_x
+    arrow["y"] = start_y
+    arrow["width"] = abs(dx)
+    arrow["height"] = abs(dy)
+    arrow["strokeColor"] = color
+    arrow["strokeWidth"] = stroke_width
+    arrow["groupIds"] = []
+    arrow["roundness"] = {"type": 2}
+    arrow["seed"] = generate_seed()
+    arrow["versionNonce"] = generate_seed()
+    arrow["boundElements"] = []
+    arrow["points"] = ((0, 0), (dx, dy))  # json/orjson выводят кортежи как массивы
+    arrow["startBinding"] = {
+        "elementId": start_id,
+        "focus": 0,
+        "gap": 5
     }
+    arrow["endBinding"] = {
+        "elementId": end_id,
+        "focus": 0,
+        "gap": 5
+    }
+    return arrow
 
 
 def create_label(text: str, x: float, y: float, width: float) -> Dict:
     """Создаёт заголовок колонки."""
-    label_id = f"label-{generate_id()}"
-    return {
-        "id": label_id,
-        "type": "text",
-        "x": x,
-        "y": y,
-        "width": width,
-        "height": 30,
-        "angle": 0,
-        "strokeColor": "#868e96",
-        "backgroundColor": "transparent",
-        "fillStyle": "solid",
-        "strokeWidth": 1,
-        "strokeStyle": "solid",
-        "roughness": 0,
-        "opacity": 100,
-        "groupIds": [],
-        "frameId": None,
-        "roundness": None,
-        "seed": generate_seed(),
-        "version": 1,
-        "versionNonce": generate_seed(),
-        "isDeleted": False,
-        "boundElements": [],
-        "updated": 1,
-        "link": None,
-        "locked": False,
-        "text": text,
-        "fontSize": 18,
-        "fontFamily": 3,
-        "textAlign": "center",
-        "verticalAlign": "top",
-        "containerId": None,
-        "originalText": text,
-        "lineHeight": 1.25
-    }
-
-
-def convert_to_excalidraw(map: HypothesisMap, title: str = "Карта гипотез") -> str:
+    label = _LABEL_TEMPLATE.copy()
+    label["id"] = f"label-{generate_id()}"
+    label["x"] = x
+    label["y"] = y
+    label["width"] = width
+    label["groupIds"] = []
+    label["seed"] = generate_seed()
+    label["versionNonce"] = generate_seed()
+    label["boundElements"] = []
+    label["text"] = text
+    label["originalText"] = text
+    return label
+
+
+def _build_elements(map: HypothesisMap, title: str) -> List[Dict]:
     """
-    Конвертирует карту гипотез в Excalidraw JSON.
+    Строит список элементов Excalidraw для карты гипотез.
 
     Раскладка горизонтальная (слева направо):
     Цель → Субъекты → Гипотезы → Задачи
     """
     elements = []
-    positions = {}  # {element_id: (x, y, width, height, card_id)}
-    card_elements = {}  # {card_id: element_dict} для обновления boundElements
+    bound_elements: Dict[str, List[Dict]] = {}  # {card_id: boundElements карточки} для привязки стрелок
+
+    # Геометрия карточек в параллельных списках: positions хранит номер строки,
+    # центр по вертикали и правый край считаются один раз при размещении
+    positions: Dict[str, int] = {}  # {element_id: row}
+    xs: List[float] = []
+    ys: List[float] = []
+    hs: List[float] = []
+    mid_ys: List[float] = []
+    right_xs: List[float] = []
+    card_ids: List[str] = []
+
+    def place_card(element_id: str, card_id: str, x: float, y: float, w: float, h: float):
+        """Запоминает геометрию карточки для раскладки задач и стрелок."""
+        positions[element_id] = len(card_ids)
+        xs.append(x)
+        ys.append(y)
+        hs.append(h)
+        mid_ys.append(y + h / 2)
+        right_xs.append(x + w)
+        card_ids.append(card_id)
 
     # Параметры раскладки
     COL_GOAL = 100
@@ -290,43 +398,34 @@ def convert_to_excalidraw(map: HypothesisMap, title: str = "Карта гипо
     SUBJECT_W, SUBJECT_H = 280, 200
     HYPOTHESIS_W, HYPOTHESIS_H = 380, 350
     TASK_W, TASK_H = 240, 100
+    TASK_GAP = 15
+
+    # Инварианты циклов раскладки считаются один раз
+    goal_color = COLORS["goal"]
+    subject_color = COLORS["subject"]
+    hypothesis_color = COLORS["hypothesis"]
+    task_color = COLORS["task"]
+    goal_step = GOAL_H + ROW_SPACING
+    subject_step = SUBJECT_H + ROW_SPACING
+    hypothesis_step = HYPOTHESIS_H + ROW_SPACING
+    task_step = TASK_H + TASK_GAP
 
     # === НАЗВАНИЕ КАРТЫ ===
-    title_elem = {
-        "id": f"title-{generate_id()}",
-        "type": "text",
-        "x": COL_GOAL,
-        "y": TITLE_Y,
-        "width": COL_TASK + TASK_W - COL_GOAL,
-        "height": 36,
-        "angle": 0,
-        "strokeColor": "#1e1e1e",
-        "backgroundColor": "transparent",
-        "fillStyle": "solid",
-        "strokeWidth": 1,
-        "strokeStyle": "solid",
-        "roughness": 0,
-        "opacity": 100,
-        "groupIds": [],
-        "frameId": None,
-        "roundness": None,
-        "seed": generate_seed(),
-        "version": 1,
-        "versionNonce": generate_seed(),
-        "isDeleted": False,
-        "boundElements": [],
-        "updated": 1,
-        "link": None,
-        "locked": False,
-        "text": title,
-        "fontSize": 28,
-        "fontFamily": 3,
-        "textAlign": "left",
-        "verticalAlign": "top",
-        "containerId": None,
-        "originalText": title,
-        "lineHeight": 1.25
-    }
+    title_elem = _LABEL_TEMPLATE.copy()
+    title_elem["id"] = f"title-{generate_id()}"
+    title_elem["x"] = COL_GOAL
+    title_elem["y"] = TITLE_Y
+    title_elem["width"] = COL_TASK + TASK_W - COL_GOAL
+    title_elem["height"] = 36
+    title_elem["strokeColor"] = COLORS["stroke"]
+    title_elem["groupIds"] = []
+    title_elem["seed"] = generate_seed()
+    title_elem["versionNonce"] = generate_seed()
+    title_elem["boundElements"] = []
+    title_elem["text"] = title
+    title_elem["fontSize"] = 28
+    title_elem["textAlign"] = "left"
+    title_elem["originalText"] = title
     elements.append(title_elem)
 
     # === ЗАГОЛОВКИ КОЛОНОК ===
@@ -341,21 +440,21 @@ def convert_to_excalidraw(map: HypothesisMap, title: str = "Карта гипо
         card_id = f"goal-{i}"
         text_id = f"goal-text-{i}"
 
-        text = f"ЦЕЛЬ\n{goal.description}\n"
+        parts = ["ЦЕЛЬ\n", goal.description, "\n"]
         if goal.metrics:
-            text += "\nМетрики:\n"
-            for m in goal.metrics[:3]:
-                text += f"• {m.name}: {m.current_value} → {m.target_value}\n"
+            parts.append("\nМетрики:\n")
+            parts.extend(f"• {m.name}: {m.current_value} → {m.target_value}\n" for m in goal.metrics[:3])
         if goal.balancing_metrics:
-            text += "\nБалансирующие:\n"
-            for m in goal.balancing_metrics[:2]:
-                text += f"• {m.name}\n"
+            parts.append("\nБалансирующие:\n")
+            parts.extend(f"• {m.name}\n" for m in goal.balancing_metrics[:2])
+        text = "".join(parts).strip()
 
-        rect, txt = create_card(card_id, text_id, COL_GOAL, y, GOAL_W, GOAL_H, COLORS["goal"], text.strip(), 12)
-        elements.extend([rect, txt])
-        card_elements[card_id] = rect
-        positions[goal.id] = (COL_GOAL, y, GOAL_W, GOAL_H, card_id)
-        y += GOAL_H + ROW_SPACING
+        rect, txt = create_card(card_id, text_id, COL_GOAL, y, GOAL_W, GOAL_H, goal_color, text, 12)
+        elements.append(rect)
+        elements.append(txt)
+        bound_elements[card_id] = rect["boundElements"]
+        place_card(goal.id, card_id, COL_GOAL, y, GOAL_W, GOAL_H)
+        y += goal_step
 
     # === СУБЪЕКТЫ ===
     y = ROW_START
@@ -363,20 +462,31 @@ def convert_to_excalidraw(map: HypothesisMap, title: str = "Карта гипо
         card_id = f"subject-{i}"
         text_id = f"subject-text-{i}"
 
-        text = f"СУБЪЕКТ\n{subject.description}\n"
+        parts = ["СУБЪЕКТ\n", subject.description, "\n"]
         if subject.pains_desires:
-            pains = [p for p in subject.pains_desires if 'боль' in p.lower() or 'страх' in p.lower()]
-            desires = [p for p in subject.pains_desires if p not in pains]
+            # Делим на боли и желания за один проход
+            pains = []
+            desires = []
+            for p in subject.pains_desires:
+                p_lower = p.lower()
+                if 'боль' in p_lower or 'страх' in p_lower:
+                    pains.append(p)
+                else:
+                    desires.append(p)
             if pains:
-                text += "\nБоли:\n" + "\n".join(f"• {p}" for p in pains[:3])
+                parts.append("\nБоли:\n")
+                parts.append("\n".join(f"• {p}" for p in pains[:3]))
             if desires:
-                text += "\n\nЖелания:\n" + "\n".join(f"• {d}" for d in desires[:3])
+                parts.append("\n\nЖелания:\n")
+                parts.append("\n".join(f"• {d}" for d in desires[:3]))
+        text = "".join(parts).strip()
 
-        rect, txt = create_card(card_id, text_id, COL_SUBJECT, y, SUBJECT_W, SUBJECT_H, COLORS["subject"], text.strip(), 11)
-        elements.extend([rect, txt])
-        card_elements[card_id] = rect
-        positions[subject.id] = (COL_SUBJECT, y, SUBJECT_W, SUBJECT_H, card_id)
-        y += SUBJECT_H + ROW_SPACING
+        rect, txt = create_card(card_id, text_id, COL_SUBJECT, y, SUBJECT_W, SUBJECT_H, subject_color, text, 11)
+        elements.append(rect)
+        elements.append(txt)
+        bound_elements[card_id] = rect["boundElements"]
+        place_card(subject.id, card_id, COL_SUBJECT, y, SUBJECT_W, SUBJECT_H)
+        y += subject_step
 
     # === ГИПОТЕЗЫ ===
     y = ROW_START
@@ -384,139 +494,201 @@ def convert_to_excalidraw(map: HypothesisMap, title: str = "Карта гипо
         card_id = f"hypothesis-{i}"
         text_id = f"hypothesis-text-{i}"
 
-        priority_label = {Priority.HIGH: "🔴 Высокий", Priority.MEDIUM: "🟡 Средний", Priority.LOW: "🟢 Низкий"}.get(hyp.priority, "")
+        priority_label = PRIORITY_LABELS.get(hyp.priority, "")
 
-        text = f"ГИПОТЕЗА {i+1}"
+        parts = [f"ГИПОТЕЗА {i+1}"]
         if priority_label:
-            text += f"\n{priority_label} приоритет"
+            parts.append(f"\n{priority_label} приоритет")
         # Переносим каждую часть гипотезы отдельно
         if_wrapped = wrap_text(hyp.if_part, 40)
         then_wrapped = wrap_text(hyp.then_part, 40)
         because_wrapped = wrap_text(hyp.because_part, 40)
         result_wrapped = wrap_text(hyp.then_metric, 40)
-        text += f"\n\nЕСЛИ {if_wrapped},\n\nТО {then_wrapped},\n\nПОТОМУ ЧТО {because_wrapped},\n\nТОГДА {result_wrapped}"
+        parts.append(f"\n\nЕСЛИ {if_wrapped},\n\nТО {then_wrapped},\n\nПОТОМУ ЧТО {because_wrapped},\n\nТОГДА {result_wrapped}")
+        text = "".join(parts).strip()
 
-        rect, txt = create_card(card_id, text_id, COL_HYPOTHESIS, y, HYPOTHESIS_W, HYPOTHESIS_H, COLORS["hypothesis"], text.strip(), 11)
-        elements.extend([rect, txt])
-        card_elements[card_id] = rect
-        positions[hyp.id] = (COL_HYPOTHESIS, y, HYPOTHESIS_W, HYPOTHESIS_H, card_id)
-        y += HYPOTHESIS_H + ROW_SPACING
+        rect, txt = create_card(card_id, text_id, COL_HYPOTHESIS, y, HYPOTHESIS_W, HYPOTHESIS_H, hypothesis_color, text, 11)
+        elements.append(rect)
+        elements.append(txt)
+        bound_elements[card_id] = rect["boundElements"]
+        place_card(hyp.id, card_id, COL_HYPOTHESIS, y, HYPOTHESIS_W, HYPOTHESIS_H)
+        y += hypothesis_step
 
     # === ЗАДАЧИ ===
     # Группируем задачи по гипотезам
-    tasks_by_hypothesis = {}
+    tasks_by_hypothesis: Dict[str, List[Task]] = defaultdict(list)
     for task in map.tasks:
-        if task.hypothesis_id not in tasks_by_hypothesis:
-            tasks_by_hypothesis[task.hypothesis_id] = []
         tasks_by_hypothesis[task.hypothesis_id].append(task)
 
     task_idx = 0
     for hyp in map.hypotheses:
-        hyp_tasks = tasks_by_hypothesis.get(hyp.id, [])
+        hyp_tasks = tasks_by_hypothesis.get(hyp.id) or ()
         if hyp_tasks:
-            hyp_pos = positions.get(hyp.id)
-            if hyp_pos:
-                hyp_y = hyp_pos[1]
-                hyp_h = hyp_pos[3]
+            hyp_row = positions.get(hyp.id)
+            if hyp_row is not None:
+                hyp_y = ys[hyp_row]
+                hyp_h = hs[hyp_row]
                 # Центрируем задачи относительно гипотезы
-                total_tasks_h = len(hyp_tasks) * TASK_H + (len(hyp_tasks) - 1) * 15
+                total_tasks_h = len(hyp_tasks) * task_step - TASK_GAP
                 task_start_y = hyp_y + (hyp_h - total_tasks_h) / 2
 
                 for j, task in enumerate(hyp_tasks):
                     card_id = f"task-{task_idx}"
                     text_id = f"task-text-{task_idx}"
-                    task_y = task_start_y + j * (TASK_H + 15)
-
-                    wrapped_desc = wrap_text(task.description, max_chars_per_line=25)
-                    rect, txt = create_card(card_id, text_id, COL_TASK, task_y, TASK_W, TASK_H, COLORS["task"], wrapped_desc, 12)
-                    elements.extend([rect, txt])
-                    card_elements[card_id] = rect
-                    positions[task.id] = (COL_TASK, task_y, TASK_W, TASK_H, card_id)
+                    task_y = task_start_y + j * task_step
+
+                    wrapped_desc, desc_lines = wrap_text_counted(task.description, 25)
+                    rect, txt = create_card(card_id, text_id, COL_TASK, task_y, TASK_W, TASK_H, task_color, wrapped_desc, 12, desc_lines)
+                    elements.append(rect)
+                    elements.append(txt)
+                    bound_elements[card_id] = rect["boundElements"]
+                    place_card(task.id, card_id, COL_TASK, task_y, TASK_W, TASK_H)
                     task_idx += 1
 
     # === СТРЕЛКИ ===
     arrow_idx = 0
     arrows = []
 
-    def add_arrow_binding(card_id: str, arrow_id: str):
-        """Добавляет привязку стрелки к карточке."""
-        if card_id in card_elements:
-            card_elements[card_id]["boundElements"].append({"id": arrow_id, "type": "arrow"})
+    def add_arrow_binding(card_id: str, ref: Dict):
+        """Добавляет привязку стрелки (готовую ссылку {"id", "type"}) к карточке."""
+        lst = bound_elements.get(card_id)
+        if lst is not None:
+            lst.append(ref)
 
     # Субъект → Цель
     for subject in map.subjects:
         if map.goals and subject.id in positions:
-            s_pos = positions[subject.id]
-            g_pos = positions[map.goals[0].id]
+            s_row = positions[subject.id]
+            g_row = positions[map.goals[0].id]
             arrow_id = f"arrow-{arrow_idx}"
+            ref = {"id": arrow_id, "type": "arrow"}  # общая для обеих карточек
 
             arrow = create_arrow(
                 arrow_id,
-                s_pos[4], g_pos[4],
-                s_pos[0], s_pos[1] + s_pos[3] / 2,
-                g_pos[0] + g_pos[2], g_pos[1] + g_pos[3] / 2,
-                COLORS["subject"], 3
+                card_ids[s_row], card_ids[g_row],
+                xs[s_row], mid_ys[s_row],
+                right_xs[g_row], mid_ys[g_row],
+                subject_color, 3
             )
             arrows.append(arrow)
-            add_arrow_binding(s_pos[4], arrow_id)
-            add_arrow_binding(g_pos[4], arrow_id)
+            add_arrow_binding(card_ids[s_row], ref)
+            add_arrow_binding(card_ids[g_row], ref)
             arrow_idx += 1
 
     # Гипотеза → Субъект
     for hyp in map.hypotheses:
         if hyp.subject_id and hyp.subject_id in positions and hyp.id in positions:
-            h_pos = positions[hyp.id]
-            s_pos = positions[hyp.subject_id]
+            h_row = positions[hyp.id]
+            s_row = positions[hyp.subject_id]
             arrow_id = f"arrow-{arrow_idx}"
+            ref = {"id": arrow_id, "type": "arrow"}  # общая для обеих карточек
 
-            color = PRIORITY_COLORS.get(hyp.priority, PRIORITY_COLORS[Priority.NONE])
-            stroke = PRIORITY_STROKE.get(hyp.priority, 2)
+            color = PRIORITY_COLORS[hyp.priority]
+            stroke = PRIORITY_STROKE[hyp.priority]
 
             arrow = create_arrow(
                 arrow_id,
-                h_pos[4], s_pos[4],
-                h_pos[0], h_pos[1] + h_pos[3] / 2,
-                s_pos[0] + s_pos[2], s_pos[1] + s_pos[3] / 2,
+                card_ids[h_row], card_ids[s_row],
+                xs[h_row], mid_ys[h_row],
+                right_xs[s_row], mid_ys[s_row],
                 color, stroke
             )
             arrows.append(arrow)
-            add_arrow_binding(h_pos[4], arrow_id)
-            add_arrow_binding(s_pos[4], arrow_id)
+            add_arrow_binding(card_ids[h_row], ref)
+            add_arrow_binding(card_ids[s_row], ref)
             arrow_idx += 1
 
     # Задача → Гипотеза
     for task in map.tasks:
         if task.hypothesis_id in positions and task.id in positions:
-            t_pos = positions[task.id]
-            h_pos = positions[task.hypothesis_id]
+            t_row = positions[task.id]
+            h_row = positions[task.hypothesis_id]
             arrow_id = f"arrow-{arrow_idx}"
+            ref = {"id": arrow_id, "type": "arrow"}  # общая для обеих карточек
 
             arrow = create_arrow(
                 arrow_id,
-                t_pos[4], h_pos[4],
-                t_pos[0], t_pos[1] + t_pos[3] / 2,
-                h_pos[0] + h_pos[2], h_pos[1] + h_pos[3] / 2,
+                card_ids[t_row], card_ids[h_row],
+                xs[t_row], mid_ys[t_row],
+                right_xs[h_row], mid_ys[h_row],
                 "#70736d", 2
             )
             arrows.append(arrow)
-            add_arrow_binding(t_pos[4], arrow_id)
-            add_arrow_binding(h_pos[4], arrow_id)
+            add_arrow_binding(card_ids[t_row], ref)
+            add_arrow_binding(card_ids[h_row], ref)
             arrow_idx += 1
 
     # Добавляем стрелки в конец (после обновления boundElements)
     elements.extend(arrows)
 
+    return elements
+
+
+def _dumps_compact(obj: Any) -> bytes:
+    """Сериализует объект в компактный UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# Поля документа Excalidraw до и после "elements"
+_DOCUMENT_HEAD = {
+    "type": "excalidraw",
+    "version": 2,
+    "source": "https://excalidraw.com",
+}
+_DOCUMENT_TAIL = {
+    "appState": {
+        "gridSize": None,
+        "viewBackgroundColor": "#ffffff"
+    },
+    "files": {}
+}
+
+# Обрамление документа для потоковой записи в файл
+_FILE_HEADER = _dumps_compact(_DOCUMENT_HEAD)[:-1] + b',"elements":['
+_FILE_FOOTER = b'],' + _dumps_compact(_DOCUMENT_TAIL)[1:]
+
+
+def _dumps_document(elements: List[Dict]) -> str:
+    """Сериализует элементы в документ Excalidraw с отступами."""
     # Формируем итоговый JSON
-    excalidraw_data = {
-        "type": "excalidraw",
-        "version": 2,
-        "source": "https://excalidraw.com",
-        "elements": elements,
-        "appState": {
-            "gridSize": None,
-            "viewBackgroundColor": "#ffffff"
-        },
-        "files": {}
-    }
+    excalidraw_data = {**_DOCUMENT_HEAD, "elements": elements, **_DOCUMENT_TAIL}
 
+    if orjson is not None:
+        return orjson.dumps(excalidraw_data, option=orjson.OPT_INDENT_2).decode("utf-8")
     return json.dumps(excalidraw_data, ensure_ascii=False, indent=2)
+
+
+@lru_cache(maxsize=32)
+def _empty_excalidraw(title: str) -> str:
+    """JSON пустой карты (название и заголовки колонок), собирается один раз на название."""
+    return _dumps_document(_build_elements(HypothesisMap(), title))
+
+
+def convert_to_excalidraw(map: HypothesisMap, title: str = "Карта гипотез") -> str:
+    """
+    Конвертирует карту гипотез в Excalidraw JSON.
+
+    Раскладка горизонтальная (слева направо):
+    Цель → Субъекты → Гипотезы → Задачи
+    """
+    if not (map.goals or map.subjects or map.hypotheses or map.tasks):
+        return _empty_excalidraw(title)
+    return _dumps_document(_build_elements(map, title))
+
+
+def convert_to_excalidraw_to_file(map: HypothesisMap, path: str, title: str = "Карта гипотез") -> None:
+    """
+    Записывает карту гипотез в .excalidraw файл без отступов.
+
+    Элементы сериализуются и пишутся по одному, поэтому весь JSON
+    целиком в памяти не собирается.
+    """
+    with open(path, "wb") as f:
+        f.write(_FILE_HEADER)
+        for i, elem in enumerate(_build_elements(map, title)):
+            if i:
+                f.write(b",")
+            f.write(_dumps_compact(elem))
+        f.write(_FILE_FOOTER)
@@ -6,17 +6,27 @@
 """
 
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict
-from enum import Enum
+from typing import Any, List, Optional, Dict
+from enum import Enum, IntEnum
 import uuid
 
 
-class Priority(Enum):
-    """Приоритет элемента карты."""
-    HIGH = "high"      # Красный #FF7373
-    MEDIUM = "medium"  # Желтый #FFD723
-    LOW = "low"        # Зеленый #9EE25B
-    NONE = "none"      # Серый #70736D
+class Priority(IntEnum):
+    """
+    Приоритет элемента карты (чем больше значение, тем выше приоритет).
+
+    Значения — числа, начиная с 1, чтобы все члены были истинными.
+    Строки прежнего формата ("high") и имена ("HIGH") читаются через from_str.
+    """
+    HIGH = 4    # Красный #FF7373
+    MEDIUM = 3  # Желтый #FFD723
+    LOW = 2     # Зеленый #9EE25B
+    NONE = 1    # Серый #70736D
+
+    @classmethod
+    def from_str(cls, value: str) -> "Priority":
+        """Получить приоритет по строке ("high", "HIGH")."""
+        return cls[value.upper()]
 
 
 class TopologyType(Enum):
@@ -115,17 +125,46 @@ class HypothesisMap:
     notes: List[Note] = field(default_factory=list)
     topology: TopologyType = TopologyType.CLASSIC
     
+    def __post_init__(self):
+        # {имя_списка: {id: позиция}} — ленивые индексы для get_*_by_id;
+        # обычный атрибут, а не поле, чтобы не попадать в asdict()/fields()
+        self._index_cache: Dict[str, Dict[str, int]] = {}
+    
+    def _get_by_id(self, name: str, element_id: str) -> Any:
+        """
+        Найти элемент по ID через индекс позиций.
+
+        Попадание проверяется по текущему списку (элемент на сохранённой
+        позиции должен иметь этот id). При промахе или устаревшей позиции
+        выполняется обычный линейный поиск; индекс перестраивается, только
+        если поиск нашёл элемент, то есть индекс действительно устарел.
+        Поэтому настоящий промах стоит столько же, сколько линейный поиск.
+        """
+        items = getattr(self, name)
+        index = self._index_cache.get(name)
+        if index is not None:
+            pos = index.get(element_id)
+            if pos is not None and pos < len(items) and items[pos].id == element_id:
+                return items[pos]
+        found = next((item for item in items if item.id == element_id), None)
+        if found is not None:
+            index = {}
+            for pos, item in enumerate(items):
+                index.setdefault(item.id, pos)  # как и раньше, побеждает первый
+            self._index_cache[name] = index
+        return found
+    
     def get_goal_by_id(self, goal_id: str) -> Optional[Goal]:
         """Получить цель по ID."""
-        return next((g for g in self.goals if g.id == goal_id), None)
+        return self._get_by_id("goals", goal_id)
     
     def get_subject_by_id(self, subject_id: str) -> Optional[Subject]:
         """Получить субъект по ID."""
-        return next((s for s in self.subjects if s.id == subject_id), None)
+        return self._get_by_id("subjects", subject_id)
     
     def get_hypothesis_by_id(self, hypothesis_id: str) -> Optional[Hypothesis]:
         """Получить гипотезу по ID."""
-        return next((h for h in self.hypotheses if h.id == hypothesis_id), None)
+        return self._get_by_id("hypotheses", hypothesis_id)
     
     def get_tasks_for_hypothesis(self, hypothesis_id: str) -> List[Task]:
         """Получить все задачи для гипотезы."""
@@ -0,0 +1,72 @@
+"""
+Тесты конвертера карты гипотез в Excalidraw.
+
+Запуск: python3 -m unittest (или pytest) из папки skill.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from model import HypothesisMap, Goal, Subject, Hypothesis, Task, Metric, Priority
+from excalidraw_converter import convert_to_excalidraw, convert_to_excalidraw_to_file
+
+
+def _sample_map() -> HypothesisMap:
+    """Небольшая карта со всеми типами карточек и стрелок."""
+    map = HypothesisMap()
+    goal = Goal(
+        description="Сохранить цоколь здания чистым",
+        metrics=[Metric(name="Загрязнений", current_value="10/день", target_value="0")],
+        balancing_metrics=[Metric(name="Не поругаться с соседями", current_value="-", target_value="-")]
+    )
+    map.goals.append(goal)
+    subject = Subject(
+        description="Владельцы собак, гуляющие у крыльца",
+        pains_desires=["Боль: собака съест что-то опасное", "Хочу гулять где удобно"]
+    )
+    map.subjects.append(subject)
+    hypothesis = Hypothesis(
+        if_part="сделать предупреждающую надпись с заботой о собаке",
+        then_part="владельцы начнут обходить наш цоколь",
+        because_part="они боятся вреда своим питомцам",
+        then_metric="количество загрязнений снизится до 0",
+        subject_id=subject.id,
+        priority=Priority.HIGH
+    )
+    map.hypotheses.append(hypothesis)
+    for desc in ["Придумать текст надписи", "Разместить на видном месте"]:
+        map.tasks.append(Task(description=desc, hypothesis_id=hypothesis.id))
+    return map
+
+
+def _normalize(data: dict) -> dict:
+    """Обнуляет случайные поля (seed, versionNonce, ID заголовков)."""
+    for elem in data["elements"]:
+        elem["seed"] = 0
+        elem["versionNonce"] = 0
+        if elem["id"].startswith(("title-", "label-")):
+            elem["id"] = elem["id"].split("-")[0]
+    return data
+
+
+class ConvertToFileTest(unittest.TestCase):
+
+    def test_file_matches_in_memory_output(self):
+        map = _sample_map()
+        fd, path = tempfile.mkstemp(suffix=".excalidraw")
+        os.close(fd)
+        try:
+            convert_to_excalidraw_to_file(map, path, title="Тест")
+            with open(path, encoding="utf-8") as f:
+                streamed = json.load(f)
+        finally:
+            os.remove(path)
+
+        in_memory = json.loads(convert_to_excalidraw(map, title="Тест"))
+        self.assertEqual(_normalize(streamed), _normalize(in_memory))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Тесты моделей карты гипотез.
+
+Запуск: python3 -m unittest (или pytest) из папки skill.
+"""
+
+import dataclasses
+import unittest
+
+from model import HypothesisMap, Hypothesis, Task, Priority
+
+
+def _hypothesis(hypothesis_id: str) -> Hypothesis:
+    return Hypothesis(
+        if_part="если",
+        then_part="то",
+        because_part="потому что",
+        then_metric="тогда",
+        id=hypothesis_id
+    )
+
+
+class HypothesisMapLookupTest(unittest.TestCase):
+
+    def test_remove_then_append_is_not_stale(self):
+        map = HypothesisMap()
+        h1 = _hypothesis("h1")
+        h2 = _hypothesis("h2")
+        map.hypotheses.append(h1)
+        self.assertIs(map.get_hypothesis_by_id("h1"), h1)
+
+        map.hypotheses.remove(h1)
+        map.hypotheses.append(h2)
+        self.assertIs(map.get_hypothesis_by_id("h2"), h2)
+        self.assertIsNone(map.get_hypothesis_by_id("h1"))
+
+    def test_in_place_replacement(self):
+        map = HypothesisMap(hypotheses=[_hypothesis("h1")])
+        self.assertIsNotNone(map.get_hypothesis_by_id("h1"))
+
+        h3 = _hypothesis("h3")
+        map.hypotheses[0] = h3
+        self.assertIsNone(map.get_hypothesis_by_id("h1"))
+        self.assertIs(map.get_hypothesis_by_id("h3"), h3)
+
+    def test_tasks_for_hypothesis_after_in_place_replacement(self):
+        map = HypothesisMap(tasks=[Task(description="a", hypothesis_id="h0")])
+        self.assertEqual(map.get_tasks_for_hypothesis("h1"), [])
+
+        task = Task(description="b", hypothesis_id="h1")
+        map.tasks[0] = task
+        self.assertEqual(map.get_tasks_for_hypothesis("h1"), [task])
+
+    def test_duplicate_id_returns_first(self):
+        first = _hypothesis("dup")
+        map = HypothesisMap(hypotheses=[first, _hypothesis("dup")])
+        self.assertIs(map.get_hypothesis_by_id("dup"), first)
+
+    def test_repeated_miss_keeps_index(self):
+        map = HypothesisMap(hypotheses=[_hypothesis("h1")])
+        map.get_hypothesis_by_id("h1")
+        index = map._index_cache["hypotheses"]
+
+        self.assertIsNone(map.get_hypothesis_by_id("missing"))
+        self.assertIsNone(map.get_hypothesis_by_id("missing"))
+        self.assertIs(map._index_cache["hypotheses"], index)
+
+    def test_cache_is_not_a_dataclass_field(self):
+        map = HypothesisMap(hypotheses=[_hypothesis("h1")])
+        map.get_hypothesis_by_id("h1")
+        self.assertNotIn("_index_cache", dataclasses.asdict(map))
+        self.assertEqual(map, HypothesisMap(hypotheses=[_hypothesis("h1")]))
+
+
+class PriorityTest(unittest.TestCase):
+
+    def test_all_members_are_truthy(self):
+        for priority in Priority:
+            self.assertTrue(priority)
+
+    def test_from_str_accepts_old_values_and_names(self):
+        self.assertIs(Priority.from_str("high"), Priority.HIGH)
+        self.assertIs(Priority.from_str("none"), Priority.NONE)
+        self.assertIs(Priority.from_str("MEDIUM"), Priority.MEDIUM)
+        with self.assertRaises(KeyError):
+            Priority.from_str("urgent")
+
+
+if __name__ == "__main__":
+    unittest.main()